@@ -1,13 +1,14 @@
 import streamlit as st
 import pandas as pd
 import os
-from pathlib import Path
+import glob
+import hashlib
 from PIL import Image # To display images
 import plotly.graph_objects as go
 
 # --- statsmodels specific imports ---
 try:
-    from statsmodels.tsa.statespace.sarimax import SARIMAX
+    from statsmodels.tsa.statespace.sarimax import SARIMAX, SARIMAXResults
     # Add other necessary imports from your notebook
 except ImportError:
     st.error("statsmodels library not found. Please install it (`pip install statsmodels`).")
@@ -16,22 +17,34 @@ except ImportError:
 # --- Constants ---
 # Paths should be relative to the root directory where streamlit run app.py is executed
 DATA_PATH_MKT = "data/raw/olist_marketing_qualified_leads_dataset.csv"
-DATA_PATH_CLOSED = "data/raw/olist_closed_deals_dataset.csv"
 FORECAST_STEPS = 13
+MODEL_CACHE_DIR = "outputs/models"
+SARIMAX_ORDER = (1, 1, 0)
+SARIMAX_SEASONAL_ORDER = (1, 1, 1, 4)
+# concentrate_scale saca sigma² de la verosimilitud (un parámetro menos que optimizar) y
+# low_memory evita guardar los estados suavizados, que get_forecast no necesita
+SARIMAX_MODEL_KWARGS = {'concentrate_scale': True}
+SARIMAX_FIT_KWARGS = {'disp': False, 'method': 'lbfgs', 'maxiter': 50, 'low_memory': True}
 
 # Ajustar la ruta para importar desde la carpeta 'src'
 import sys
-# Obtener la ruta absoluta del directorio actual del script (app.py)
-current_dir = os.path.dirname(os.path.abspath(__file__))
-# Obtener la ruta absoluta del directorio 'src'
-src_dir = os.path.join(current_dir, 'src')
-# Añadir el directorio 'src' al sys.path
-if src_dir not in sys.path:
-    sys.path.append(src_dir)
-
-# Ahora podemos importar los módulos
+
+@st.cache_resource(show_spinner=False) # Se ejecuta una vez por proceso, no en cada rerun
+def _bootstrap():
+    # Obtener la ruta absoluta del directorio actual del script (app.py)
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    # Obtener la ruta absoluta del directorio 'src'
+    src_dir = os.path.join(current_dir, 'src')
+    # Añadir el directorio 'src' al sys.path
+    if src_dir not in sys.path:
+        sys.path.append(src_dir)
+    return current_dir, src_dir
+
+current_dir, src_dir = _bootstrap()
+
+# Ahora podemos importar los módulos (tras el primer run ya están en sys.modules)
 try:
-    from data_loader import load_data
+    from data_loader import load_data, load_dataset, write_atomic
     from preprocessing import preprocess_data
     from attribution_analysis import calculate_origin_conversion, calculate_funnel_metrics, calculate_origin_score
     from plotting import plot_days_to_convert_boxplot, plot_conversion_scatter, plot_actual_vs_predicted_weekly, plot_aggregated_mqls_by_period
@@ -61,61 +74,116 @@ def load_and_process_data():
     if df_raw.empty:
         st.error(f"No se pudieron cargar los datos desde {data_dir}. Verifica la ruta y los archivos CSV.")
         return None, None, None # Devolver None si hay error
-    df_processed = preprocess_data(df_raw.copy()) # Usar una copia para evitar modificar el df original en caché
+    df_processed = preprocess_data(df_raw) # preprocess_data no modifica df_raw, no hace falta copiarlo
     return df_raw, df_processed, data_dir # Devolvemos data_dir para debugging si es necesario
 
 df_raw, df_processed, data_path_used = load_and_process_data()
 
+# --- Etapas del análisis (cada una con su propio cache) ---
+def _df_fingerprint(df):
+    """Hash barato para los DataFrames de entrada: forma, columnas y bytes del índice (evita hashear todo el contenido)."""
+    return (df.shape, tuple(df.columns), hash(df.index.values.tobytes()))
+
+@st.cache_data(hash_funcs={pd.DataFrame: _df_fingerprint})
+def _funnel(df_raw):
+    return calculate_funnel_metrics(df_raw)
+
+@st.cache_data(hash_funcs={pd.DataFrame: _df_fingerprint})
+def _origin(df_processed):
+    return calculate_origin_conversion(df_processed)
+
+@st.cache_data(hash_funcs={pd.DataFrame: _df_fingerprint})
+def _score(origin_conversion_df):
+    return calculate_origin_score(origin_conversion_df)
+
+# --- Forecast helpers ---
+def _load_weekly_series(mkt_data_path):
+    """
+    Loads the MQL dataset and aggregates the MQLs into a weekly (W-MON) series.
+    The closed deals are not needed here: the series only counts MQLs by contact date.
+    """
+    # --- 1. Load Data ---
+    # Parquet copy of the CSV (see load_dataset): typed dates and only the column
+    # used by the forecast is materialized (each row is one MQL)
+    contact_dates = load_dataset(mkt_data_path, columns=['first_contact_date'])['first_contact_date']
+
+    # --- 2. Aggregate by day
+    # value_counts (pandas' hashed counter) already drops NaT, so no dropna/groupby pass is needed
+    mql_daily_counts = contact_dates.loc[contact_dates <= '2018-05-28'].value_counts().sort_index()
+    # --- 3. Aggregate by week
+    # the weekly resample gives 0 to weeks without MQLs, so the days are not reindexed/filled.
+    # Weekly counts fit comfortably in int32.
+    return mql_daily_counts.resample('W-MON').sum()\
+                           .astype('int32').rename_axis('first_contact_date').to_frame('mql_count')
+
+def _fit_or_load_sarimax(series, cache_dir):
+    """
+    Returns the fitted SARIMAX results for `series`. The fit is persisted in `cache_dir`
+    keyed by a hash of the series (values + index) and the model/fit settings, so it only
+    runs again when the input data or the model specification change.
+    """
+    key_source = series.values.tobytes() + series.index.asi8.tobytes() + \
+        repr((SARIMAX_ORDER, SARIMAX_SEASONAL_ORDER, SARIMAX_MODEL_KWARGS, SARIMAX_FIT_KWARGS)).encode()
+    key = hashlib.blake2b(key_source, digest_size=16).hexdigest()
+    model_path = os.path.join(cache_dir, f"sarimax_{key}.pkl")
+
+    if os.path.exists(model_path):
+        try:
+            return SARIMAXResults.load(model_path)
+        except Exception as e: # e.g. pickle written by another statsmodels version: refit
+            print(f"Warning: could not load {model_path} ({e}), refitting the model")
+
+    model = SARIMAX(series, order=SARIMAX_ORDER, seasonal_order=SARIMAX_SEASONAL_ORDER, **SARIMAX_MODEL_KWARGS)
+    resultado = model.fit(**SARIMAX_FIT_KWARGS)
+    # Atomic write (another worker never reads a half-written pickle). The cache is optional:
+    # if it cannot be written the fitted model is still returned
+    try:
+        write_atomic(model_path, resultado.save)
+    except OSError as e:
+        print(f"Warning: could not save {model_path}: {e}")
+        return resultado
+    # Only the current fit is kept: prune the pickles of older data/settings
+    for old_path in glob.glob(os.path.join(glob.escape(cache_dir), 'sarimax_*.pkl')):
+        if old_path != model_path:
+            try:
+                os.remove(old_path)
+            except FileNotFoundError: # already removed by another worker
+                pass
+    return resultado
+
+def _aggregate_by_month(df, label):
+    """
+    Sums the weekly 'mql_count' by calendar month (Period 'M') and tags the rows with `label`.
+    """
+    monthly = df.groupby(df['first_contact_date'].dt.to_period('M'))['mql_count'].sum()
+    return monthly.rename_axis('contact_period').reset_index()\
+                  .assign(**{'Data Type': label})[['contact_period', 'Data Type', 'mql_count']]
+
 # --- Cached Data Processing and Modeling Function ---
-# (This function remains the same as previously defined)
 @st.cache_data # Use st.cache_data for data/models
-def generate_forecast_data(mkt_data_path, closed_data_path, forecast_n):
+def generate_forecast_data(mkt_data_path, forecast_n, model_cache_dir=MODEL_CACHE_DIR):
     """
-    Loads data, preprocesses, trains SARIMA, predicts, and prepares DFs for plotting.
+    Loads data, preprocesses, trains SARIMA (or loads the persisted fit), predicts, and prepares DFs for plotting.
     """
     try:
-        # --- 1. Load Data ---
-        df_mkt = pd.read_csv(mkt_data_path)
-        df_closed = pd.read_csv(closed_data_path)
-
-        # --- 2. Preprocessing (Adapt from your notebook) ---
-        df_mkt_closed = df_mkt.merge(df_closed, on='mql_id', how='left')
-        df_processed = df_mkt_closed.assign(
-            first_contact_date=lambda df: pd.to_datetime(df['first_contact_date'], errors='coerce'),
-        ).dropna(subset=['first_contact_date'])
-        # --- 3. Aggregate by day
-        mql_daily_series = df_processed.groupby('first_contact_date', as_index=False).agg(mql_count=('mql_id', 'count'))\
-                                .sort_values('first_contact_date')
-        #
-        # Reindexar a frecuencia diaria completa
-        full_range = pd.date_range(start=mql_daily_series['first_contact_date'].min(), end=mql_daily_series['first_contact_date'].max(), freq='D')
-        mql_daily_series = mql_daily_series.set_index('first_contact_date').reindex(full_range).fillna(0).rename_axis('first_contact_date').reset_index()
-        # Asegúrate de que la columna de valores es numérica
-        mql_daily_series['mql_count'] = mql_daily_series['mql_count'].astype(int)
-
-        # Convertir a TimeSeries
-        mql_daily_series_pd = mql_daily_series.query(" first_contact_date <= '2018-05-28' ").set_index('first_contact_date')
-        mql_weekly_series_pd = mql_daily_series_pd.resample('W-MON').sum()
-
-        # Suponiendo que `serie` es un pandas Series con índice de tiempo
-        model = SARIMAX(mql_weekly_series_pd, order=(1, 1, 0), seasonal_order=(1, 1, 1, 4))
-        # --- 3. Train Model (Use parameters from notebook) ---
-        resultado = model.fit(disp=False)
+        mql_weekly_series_pd = _load_weekly_series(mkt_data_path)
+        # --- 3. Train Model (or load it from disk if it was already fitted) ---
+        resultado = _fit_or_load_sarimax(mql_weekly_series_pd, model_cache_dir)
         # --- 4. Predict ---
         forecast_ts = resultado.get_forecast(steps=forecast_n).predicted_mean
         # --- 5. Post-processing for Plots ---
         df_predicciones = forecast_ts.reset_index().round(0)
         df_predicciones.columns = ['first_contact_date', 'mql_count']
+        df_predicciones['mql_count'] = df_predicciones['mql_count'].astype('float32')
         df_predicciones['Data Type'] = 'Predicted'
         #
         mql_weekly_series_pd_reset = mql_weekly_series_pd.reset_index()
         mql_weekly_series_pd_reset['Data Type'] = 'Actual'
         #
-        df_concat = pd.concat([mql_weekly_series_pd_reset, df_predicciones], axis=0)
-        df_concat['contact_period'] = df_concat['first_contact_date'].astype(str).str[:7]
-        #
-        df_predict_agg = df_concat.groupby(['contact_period', 'Data Type'])\
-                                    .agg(mql_count=('mql_count', 'sum')).reset_index()
+        df_predict_agg = pd.concat([_aggregate_by_month(mql_weekly_series_pd_reset, 'Actual'),
+                                    _aggregate_by_month(df_predicciones, 'Predicted')], ignore_index=True)\
+                           .sort_values(['contact_period', 'Data Type'], ignore_index=True)
+        df_predict_agg['contact_period'] = df_predict_agg['contact_period'].astype(str)
 
         return mql_weekly_series_pd_reset, df_predicciones, df_predict_agg
 
@@ -129,6 +197,20 @@ def generate_forecast_data(mkt_data_path, closed_data_path, forecast_n):
         st.error(f"An error occurred during data processing or modeling: {e}")
         return None, None, None
 
+# --- Imágenes de evaluación ---
+EVAL_FIGURES = ('comparacion_modelos_pronostico.png', 'acf_mqls_semanales.png',
+                'comparacion_modelos_pronostico_semanales.png', 'sarimax_analisis_residuos_semanales.png')
+# Ancho fijo (px) de cada figura: con un ancho fijo st.image coloca la lista en fila, como la cuadrícula de 4 columnas
+EVAL_IMAGE_WIDTH = 340
+
+@st.cache_resource(show_spinner=False) # Los objetos PIL se comparten entre sesiones (no se serializan)
+def _load_eval_image(path, mtime):
+    """
+    Decodifica una imagen de evaluación una sola vez. `mtime` forma parte de la clave, así una
+    figura regenerada se vuelve a cargar; si la carga falla se lanza la excepción (no se cachea).
+    """
+    return Image.open(path).convert("RGB")
+
 # --- Ejecución del Análisis y Visualización (si los datos se cargaron) ---
 if df_processed is not None:
 
@@ -138,7 +220,7 @@ if df_processed is not None:
     # Asegúrate de que df_raw tiene las columnas necesarias ('mql_id', 'sr_id', 'won_date')
     # O ajusta calculate_funnel_metrics para usar df_processed si es más conveniente
     # Revisando el código, df_processed ya contiene las columnas necesarias después del merge y antes del drop.
-    funnel_metrics = calculate_funnel_metrics(df_raw) # Usamos df_raw que es el merge inicial
+    funnel_metrics = _funnel(df_raw) # Usamos df_raw que es el merge inicial
 
     col1, col2, col3 = st.columns(3)
     col1.metric("Leads Calificados (MQL)", f"{funnel_metrics['n_mql']:,}")
@@ -156,8 +238,8 @@ if df_processed is not None:
 
     # --- Sección: Análisis por Origen ---
     st.header("🎯 Análisis de Conversión por Origen")
-    origin_conversion_df = calculate_origin_conversion(df_processed)
-    origin_score_df = calculate_origin_score(origin_conversion_df)
+    origin_conversion_df = _origin(df_processed)
+    origin_score_df = _score(origin_conversion_df)
 
     st.subheader("Tabla de Métricas por Origen")
     # Asegurarse de que las columnas existen antes de aplicar formato
@@ -182,21 +264,24 @@ if df_processed is not None:
 
     with col_a:
         st.subheader("Distribución del Tiempo de Conversión")
-        try:
+        # Validar las columnas de entrada en lugar de capturar cualquier excepción del gráfico
+        missing_cols = {'origin', 'target', 'days_to_convert'} - set(df_processed.columns)
+        if not missing_cols:
             fig_boxplot = plot_days_to_convert_boxplot(df_processed)
             st.plotly_chart(fig_boxplot, use_container_width=True)
             st.caption("Boxplot mostrando la mediana, cuartiles y outliers de los días necesarios para convertir un lead, según su origen.")
-        except Exception as e:
-            st.warning(f"No se pudo generar el gráfico de distribución de tiempo: {e}")
+        else:
+            st.warning(f"No se pudo generar el gráfico de distribución de tiempo, faltan las columnas: {sorted(missing_cols)}")
 
     with col_b:
         st.subheader("Rendimiento de Canales por Peso de Conversión y Días para Convertir")
-        try:
+        missing_cols = {'origin', 'mql', 'norm_weighted_conversion', 'norm_days_to_convert', 'origin_score'} - set(origin_score_df.columns)
+        if not missing_cols:
             fig_scatter = plot_conversion_scatter(origin_score_df)
             st.plotly_chart(fig_scatter, use_container_width=True)
             st.caption("Gráfico de burbujas que segmenta el rendimiento del canal por peso de conversión y días para convertir, el tamaño de las burbujas esta dado por el score propuesto.")
-        except Exception as e:
-            st.warning(f"No se pudo generar el gráfico de rendimiento de canales: {e}")
+        else:
+            st.warning(f"No se pudo generar el gráfico de rendimiento de canales, faltan las columnas: {sorted(missing_cols)}")
 
     # --- Mostrar Datos Crudos (Opcional y colapsable) ---
     st.markdown("¿Quieres ver los datos de la **metodología** aplicada?")
@@ -206,69 +291,74 @@ if df_processed is not None:
     # --- Sección: Forecast ---
     st.divider()
     st.header("Resultados de la Predicción de MQLs")
-    st.markdown(
-        """
-        Bienvenid@ al **Forecast de MQLs**.
+    # El forecast (SARIMAX + gráficas) solo se ejecuta si el usuario lo pide; generate_forecast_data
+    # sigue en caché, así que activarlo de nuevo no vuelve a entrenar el modelo
+    if st.toggle("Mostrar forecast", value=False, key='show_forecast'):
+        st.markdown(
+            """
+            Bienvenid@ al **Forecast de MQLs**.
 
-        En esta sección podrás ver los resultados de la predicción de MQLs:
+            En esta sección podrás ver los resultados de la predicción de MQLs:
 
-        - 📈 **Evaluación de Frecuencia**: Se evaluó la frecuencia de los datos para poder realizar un pronóstico más preciso.
-        - 📊 **Comparación de Modelos**: Se compararon los resultados de los diferentes modelos de pronóstico.
-        - 📈 **Pronóstico**: Se realizó un pronóstico de los MQLs para los próximos 3 meses.
-
-        Explora los resultados para tomar decisiones informadas basadas en datos.
-    """
-    )
+            - 📈 **Evaluación de Frecuencia**: Se evaluó la frecuencia de los datos para poder realizar un pronóstico más preciso.
+            - 📊 **Comparación de Modelos**: Se compararon los resultados de los diferentes modelos de pronóstico.
+            - 📈 **Pronóstico**: Se realizó un pronóstico de los MQLs para los próximos 3 meses.
 
-    st.title("Forecasting")
-    st.markdown("Dentro del análisis se decidio agrupar los datos por semana, para poder realizar un pronóstico más preciso")
+            Explora los resultados para tomar decisiones informadas basadas en datos.
+        """
+        )
 
+        st.title("Forecasting")
+        st.markdown("Dentro del análisis se decidio agrupar los datos por semana, para poder realizar un pronóstico más preciso")
 
-    st.header("Gráficas de Evaluación de Modelos")
 
-    #
-    fig_dir = os.path.join(current_dir, 'outputs', 'figures')
-    st.write(f"Static images from model evaluation (source: `{fig_dir}`):")
-    names_fig = ['comparacion_modelos_pronostico.png', 'acf_mqls_semanales.png',
-                 'comparacion_modelos_pronostico_semanales.png', 'sarimax_analisis_residuos_semanales.png']
-    image_files = [os.path.join(fig_dir, name) for name in names_fig]
-    # Crear contenedores para mostrar las imágenes
-    cols = st.columns(min(4, len(image_files)))
-    for i, img_file in enumerate(image_files):
-        try:
-            image = Image.open(img_file)
-            cols[i % len(cols)].image(image, caption=os.path.basename(img_file), use_container_width=True)
-        except Exception as e:
-            cols[i % len(cols)].error(f"Could not load image {img_file}: {e}")
+        st.header("Gráficas de Evaluación de Modelos")
 
-    # Separador y siguiente sección
-    st.divider()
-    st.header("SARIMA Resultados de la Predicción")
-
-    # --- Generate Data and Plots ---
-    # Call the cached function
-    actual_data_df, forecast_data_df, aggregated_data_df = generate_forecast_data(
-        DATA_PATH_MKT, DATA_PATH_CLOSED, FORECAST_STEPS)
-
-    # Display Plot 1
-    st.subheader("Real Semanal vs. Predicción")
-    if actual_data_df is not None and forecast_data_df is not None:
-        fig1 = plot_actual_vs_predicted_weekly(actual_data_df, forecast_data_df)
-        st.plotly_chart(fig1, use_container_width=True)
-    else:
-        st.warning("Could not generate data for the weekly actual vs predicted plot. Check data paths and processing steps.")
-
-    # Display Plot 2
-    st.subheader("MQLs Agregados por Periodo (Real vs. Predicción)")
-    if aggregated_data_df is not None:
-        fig2 = plot_aggregated_mqls_by_period(aggregated_data_df)
-        st.plotly_chart(fig2, use_container_width=True)
-    else:
-        st.warning("Could not generate data for the aggregated MQL plot. Check data processing and aggregation steps.")
+        #
+        fig_dir = os.path.join(current_dir, 'outputs', 'figures')
+        st.write(f"Static images from model evaluation (source: `{fig_dir}`):")
+        images, captions = [], []
+        for name in EVAL_FIGURES:
+            img_file = os.path.join(fig_dir, name)
+            try:
+                # Solo un stat por archivo en cada rerun; el decode queda en cache mientras no cambie
+                images.append(_load_eval_image(img_file, os.path.getmtime(img_file)))
+                captions.append(name)
+            except Exception as e:
+                st.error(f"Could not load image {img_file}: {e}")
+        if images:
+            # Una sola llamada a st.image: todas las imágenes viajan al navegador en un mismo mensaje.
+            # width fijo (disponible en todas las versiones de streamlit soportadas) para que queden en fila
+            st.image(images, caption=captions, width=EVAL_IMAGE_WIDTH)
+
+        # Separador y siguiente sección
+        st.divider()
+        st.header("SARIMA Resultados de la Predicción")
+
+        # --- Generate Data and Plots ---
+        # Call the cached function
+        actual_data_df, forecast_data_df, aggregated_data_df = generate_forecast_data(
+            DATA_PATH_MKT, FORECAST_STEPS)
+
+        # Display Plot 1
+        st.subheader("Real Semanal vs. Predicción")
+        if actual_data_df is not None and forecast_data_df is not None:
+            fig1 = plot_actual_vs_predicted_weekly(actual_data_df, forecast_data_df)
+            st.plotly_chart(fig1, use_container_width=True)
+        else:
+            st.warning("Could not generate data for the weekly actual vs predicted plot. Check data paths and processing steps.")
+
+        # Display Plot 2
+        st.subheader("MQLs Agregados por Periodo (Real vs. Predicción)")
+        if aggregated_data_df is not None:
+            fig2 = plot_aggregated_mqls_by_period(aggregated_data_df)
+            st.plotly_chart(fig2, use_container_width=True)
+        else:
+            st.warning("Could not generate data for the aggregated MQL plot. Check data processing and aggregation steps.")
         
-    st.write("---")
-    st.markdown("""Nota: Los pronósticos se generaron con un modelo SARIMAX sobre la serie semanal mql_weekly_series_pd, usando order=(1, 1, 0) y seasonal_order=(1, 1, 1, 4).
-                El modelo captura tanto la tendencia como la estacionalidad cada 4 semanas, utilizando componentes autorregresivos y de diferencia para estabilizar la serie.""")
+        st.write("---")
+        st.markdown("""Nota: Los pronósticos se generaron con un modelo SARIMAX sobre la serie semanal mql_weekly_series_pd, usando order=(1, 1, 0) y seasonal_order=(1, 1, 1, 4).
+                    El modelo captura tanto la tendencia como la estacionalidad cada 4 semanas, utilizando componentes autorregresivos y de diferencia para estabilizar la serie.""")
 # You can add other high-level elements or introductory content here.
 # The navigation to the "Forecast" page will be handled automatically by Streamlit
 # because of the file in the pages/ directory.
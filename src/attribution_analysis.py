@@ -11,12 +11,14 @@ def calculate_origin_conversion(df_processed: pd.DataFrame) -> pd.DataFrame:
     Returns:
         DataFrame con métricas de conversión por origen.
     """
-    origin_conversion = df_processed.query("origin != 'unknown'")\
-                            .groupby('origin', as_index=False)\
-                            .agg(
-                                mql=('mql_id', 'count'),
-                                won=('target', 'sum'),
-                                days_to_convert_q3=('days_to_convert', lambda x: x.quantile(0.75)))
+    grouped = df_processed.query("origin != 'unknown'")\
+                          .groupby('origin', observed=True, sort=False)
+    # Cada agregación usa el kernel vectorizado de pandas (sin lambda por grupo)
+    origin_conversion = pd.concat([
+        grouped['mql_id'].count().rename('mql'),
+        grouped['target'].sum().rename('won'),
+        grouped['days_to_convert'].quantile(0.75).rename('days_to_convert_q3')
+    ], axis=1).reset_index()
     # Calcular los porcentajes
     total_mql = origin_conversion['mql'].sum()
     total_won = origin_conversion['won'].sum()
@@ -43,11 +45,18 @@ def calculate_funnel_metrics(df_mkt_closed: pd.DataFrame) -> dict:
         Un diccionario con las métricas del funnel (n_mql, n_sql, n_won, 
         conversion_mql_to_sql, conversion_sql_to_won, conversion_mql_to_won).
     """
-    n_mql = df_mkt_closed['mql_id'].nunique()
+    # Un solo factorize de 'mql_id' (NaN -> -1); cada conteo es un bincount sobre los códigos
+    codes, uniques = pd.factorize(df_mkt_closed['mql_id'])
+    valid = codes >= 0
+
+    def _n_unique(mask: np.ndarray) -> int:
+        return int(np.count_nonzero(np.bincount(codes[mask & valid], minlength=len(uniques))))
+
+    n_mql = len(uniques)
     # Asumiendo que 'sr_id' indica un SQL (Sales Qualified Lead)
-    n_sql = df_mkt_closed[df_mkt_closed['sr_id'].notna()]['mql_id'].nunique()
+    n_sql = _n_unique(df_mkt_closed['sr_id'].notna().to_numpy())
     # Asumiendo que 'won_date' indica una conversión (Won)
-    n_won = df_mkt_closed[df_mkt_closed['won_date'].notna()]['mql_id'].nunique()
+    n_won = _n_unique(df_mkt_closed['won_date'].notna().to_numpy())
 
     # Evitar división por cero si no hay MQLs o SQLs
     conversion_mql_to_sql = (n_sql / n_mql) if n_mql > 0 else 0
@@ -65,6 +74,34 @@ def calculate_funnel_metrics(df_mkt_closed: pd.DataFrame) -> dict:
     
     return metrics
 
+def _min_max_scale(values: np.ndarray, invert: bool = False) -> np.ndarray:
+    """
+    Min-max scales a NumPy array to 0-1 (NaNs are ignored for the bounds and kept as NaN).
+    With invert=True the lowest value gets 1. Returns 0.5 everywhere if all values are equal.
+    """
+    if values.size == 0:
+        return values
+    min_val, max_val = np.nanmin(values), np.nanmax(values)
+    if not max_val > min_val: # Avoid division by zero
+        return np.full(values.shape, 0.5) # Assign mid-value if all are the same
+    if invert:
+        return (max_val - values) / (max_val - min_val)
+    return (values - min_val) / (max_val - min_val)
+
+def _score_kernel(wc: np.ndarray, days: np.ndarray, w_conv: float, w_speed: float) -> tuple:
+    """
+    Normalizes weighted conversion (higher is better) and days (lower is better) and combines
+    them into the origin score, all on plain float64 arrays (no pandas dispatch).
+
+    Returns:
+        tuple: (norm_wc, norm_days, score) arrays aligned with the inputs.
+    """
+    norm_wc = _min_max_scale(wc)
+    norm_days = _min_max_scale(days, invert=True)
+    score = norm_wc * w_conv
+    score += norm_days * w_speed # In place: no extra temporary for the sum
+    return norm_wc, norm_days, score
+
 def calculate_origin_score(df: pd.DataFrame, weight_conversion: float = 0.6, weight_speed: float = 0.4) -> pd.DataFrame:
     """
     Calculates a combined score for origin performance based on
@@ -85,50 +122,26 @@ def calculate_origin_score(df: pd.DataFrame, weight_conversion: float = 0.6, wei
     if not np.isclose(weight_conversion + weight_speed, 1.0):
         raise ValueError("Weights must sum to 1.0")
 
-    # --- 1. Normalization (Manual Min-Max Scaling 0-1) ---
-    # Create copies to avoid SettingWithCopyWarning if df is a slice
-    df_scored = df.copy()
-
-    # Handle cases where required columns might not exist or have NaNs
-    if 'weighted_conversion' not in df_scored.columns or 'days_to_convert_q3' not in df_scored.columns:
+    # Handle cases where required columns might not exist
+    if 'weighted_conversion' not in df.columns or 'days_to_convert_q3' not in df.columns:
         raise ValueError("Input DataFrame must contain 'weighted_conversion' and 'days_to_convert_q3' columns.")
 
-    # Fill NaNs before normalization to avoid issues if a whole column is NaN
-    # For days_to_convert_q3, filling with max might be more appropriate (worst case)
-    df_scored['weighted_conversion'].fillna(0, inplace=True)
-    # Check if days_to_convert_q3 has non-NaN values before filling with max
-    if df_scored['days_to_convert_q3'].notna().any():
-        max_days_val = df_scored['days_to_convert_q3'].max()
-        df_scored['days_to_convert_q3'].fillna(max_days_val, inplace=True)
-    else: # If all are NaN, fill with a default (e.g., 0 or handle differently)
-        df_scored['days_to_convert_q3'].fillna(0, inplace=True) 
-
-
-    # a) Weighted Conversion (Higher is better)
-    min_wc = df_scored['weighted_conversion'].min()
-    max_wc = df_scored['weighted_conversion'].max()
-    if max_wc > min_wc: # Avoid division by zero
-        df_scored['norm_weighted_conversion'] = (df_scored['weighted_conversion'] - min_wc) / (max_wc - min_wc)
-    else:
-        df_scored['norm_weighted_conversion'] = 0.5 # Assign mid-value if all are the same
-
-    # b) Days to Convert Q3 (Lower is better - INVERTED scale)
-    min_days = df_scored['days_to_convert_q3'].min()
-    max_days = df_scored['days_to_convert_q3'].max()
-    if max_days > min_days: # Avoid division by zero
-        # Inverted scale: (max - value) / (max - min)
-        df_scored['norm_days_to_convert'] = (max_days - df_scored['days_to_convert_q3']) / (max_days - min_days)
-    else:
-        df_scored['norm_days_to_convert'] = 0.5 # Assign mid-value if all are the same
-
-    # Handle potential NaNs introduced during calculation (though previous fillna should prevent this)
-    df_scored['norm_weighted_conversion'].fillna(0, inplace=True)
-    df_scored['norm_days_to_convert'].fillna(0, inplace=True)
-
-
-    # --- 2. Weighted Combination ---
-    df_scored['origin_score'] = (weight_conversion * df_scored['norm_weighted_conversion'] + 
-                                 weight_speed * df_scored['norm_days_to_convert'])
+    # --- 1. Normalization (Manual Min-Max Scaling 0-1) on plain NumPy arrays ---
+    # NaN weighted conversion counts as 0; NaN days as the slowest origin (worst case), or 0 if all are NaN
+    weighted_conversion = df['weighted_conversion'].to_numpy(dtype=np.float64, na_value=0.0)
+    days = df['days_to_convert_q3'].to_numpy(dtype=np.float64, na_value=np.nan)
+    days = np.where(np.isnan(days), np.nanmax(days) if not np.isnan(days).all() else 0.0, days)
+
+    # --- 2. Weighted Combination (a: weighted conversion, higher is better; b: days, lower is better) ---
+    norm_weighted_conversion, norm_days_to_convert, origin_score = _score_kernel(
+        weighted_conversion, days, weight_conversion, weight_speed)
+
+    # The result frame is assembled once, at the end
+    df_scored = df.assign(weighted_conversion=weighted_conversion,
+                          days_to_convert_q3=days,
+                          norm_weighted_conversion=norm_weighted_conversion,
+                          norm_days_to_convert=norm_days_to_convert,
+                          origin_score=origin_score)
     #
     # Ensure all columns exist before selecting
     list_cols_sel = ['origin', 'mql', 'conversion', 'weighted_conversion', 'days_to_convert_q3', 'norm_weighted_conversion', 'norm_days_to_convert', 'origin_score']
@@ -1,14 +1,146 @@
 import pandas as pd
 import os
+import glob
+import hashlib
+import tempfile
+import pyarrow as pa
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
+from concurrent.futures import ThreadPoolExecutor
 
-def load_data(data_path: str = '../data/raw') -> pd.DataFrame:
+# Columnas de fecha de cada dataset: se parsean una sola vez, al crear la copia Parquet
+DATE_COLUMNS = {
+    'olist_marketing_qualified_leads_dataset.csv': ['first_contact_date'],
+    'olist_closed_deals_dataset.csv': ['won_date'],
+}
+# Columnas de baja cardinalidad que se guardan como diccionario (category en pandas)
+CATEGORY_COLUMNS = ['origin', 'lead_type', 'business_segment']
+# Versión de la conversión CSV -> Parquet: se incrementa cada vez que cambia _read_csv_typed
+PARQUET_BUILD_VERSION = 2
+# Etiqueta del esquema de la copia Parquet: si cambian los tipos de arriba o la conversión, cambia el nombre del archivo
+PARQUET_SCHEMA_TAG = hashlib.blake2b(repr((DATE_COLUMNS, CATEGORY_COLUMNS, PARQUET_BUILD_VERSION)).encode(),
+                                     digest_size=4).hexdigest()
+
+def _read_csv_typed(csv_path: str) -> pa.Table:
+    """
+    Lee el CSV con el lector multihilo de pyarrow; las categorías se tipan en la propia lectura.
+    Las fechas se leen como texto y se convierten después con errors='coerce': una fecha inválida
+    queda como NaT en lugar de hacer fallar la lectura de todo el archivo (format='ISO8601'
+    requiere pandas >= 2.0). Cualquier cambio aquí debe ir acompañado de subir PARQUET_BUILD_VERSION.
+    """
+    date_columns = DATE_COLUMNS.get(os.path.basename(csv_path), [])
+    column_types = {col: pa.dictionary(pa.int32(), pa.string()) for col in CATEGORY_COLUMNS}
+    column_types.update({col: pa.string() for col in date_columns})
+    table = pv.read_csv(csv_path, convert_options=pv.ConvertOptions(column_types=column_types,
+                                                                     strings_can_be_null=True))
+    for col in date_columns:
+        dates = pd.to_datetime(table[col].to_pandas(), format='ISO8601', errors='coerce').astype('datetime64[us]')
+        table = table.set_column(table.schema.get_field_index(col), col, pa.Array.from_pandas(dates))
+    return table
+
+# umask del proceso, leído una sola vez al importar (os.umask solo se puede leer cambiándolo,
+# y hacerlo en cada escritura no es seguro con varios hilos)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def write_atomic(path: str, write) -> None:
+    """
+    Escribe un archivo de forma atómica: `write(tmp_path)` escribe en un temporal del mismo
+    directorio, que luego se renombra a `path` con os.replace. Nunca queda un archivo a medio
+    escribir con el nombre definitivo, y el temporal se borra si la escritura falla. El temporal
+    es único por llamada (tempfile.mkstemp), así que dos hilos pueden escribir la misma ruta a la vez;
+    antes de renombrarlo se le dan los permisos de un archivo normal (0o666 & ~umask), no los 0600 de mkstemp.
+
+    Args:
+        path (str): Ruta final del archivo (se crea el directorio si no existe).
+        write (callable): Función que recibe la ruta temporal y escribe en ella.
+
+    Raises:
+        OSError: Si no se puede crear el directorio o escribir/renombrar el archivo.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.chmod(tmp_path, 0o666 & ~_UMASK)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _write_parquet_atomic(table: pa.Table, parquet_path: str) -> None:
+    """
+    Escribe el Parquet con write_atomic y después borra las copias de esquemas anteriores del mismo CSV.
+    """
+    write_atomic(parquet_path, lambda tmp_path: pq.write_table(table, tmp_path, compression='snappy'))
+    base = parquet_path[:-len(f".{PARQUET_SCHEMA_TAG}.parquet")]
+    for old_path in glob.glob(glob.escape(base) + '.parquet') + glob.glob(glob.escape(base) + '.*.parquet'):
+        if old_path != parquet_path:
+            try:
+                os.remove(old_path)
+            except FileNotFoundError: # otro proceso ya la borró
+                pass
+
+def load_dataset(csv_path: str, columns: list = None) -> pd.DataFrame:
+    """
+    Lee un dataset a partir de una copia Parquet guardada junto al CSV.
+
+    La primera vez (o si el CSV es más reciente que el Parquet, o el Parquet no se puede leer) se
+    lee el CSV con pyarrow, parseando las fechas, y se escribe '<nombre>.<PARQUET_SCHEMA_TAG>.parquet'.
+    Las siguientes lecturas van directo al Parquet, que es columnar y tipado, y solo materializan
+    las columnas pedidas.
+
+    Args:
+        csv_path (str): Ruta al archivo CSV.
+        columns (list): Columnas a leer. Si es None se leen todas.
+
+    Returns:
+        pd.DataFrame: Contenido del dataset.
+    """
+    parquet_path = f"{os.path.splitext(csv_path)[0]}.{PARQUET_SCHEMA_TAG}.parquet"
+    if os.path.exists(parquet_path) and os.path.getmtime(parquet_path) >= os.path.getmtime(csv_path):
+        try:
+            return pd.read_parquet(parquet_path, columns=columns)
+        except (OSError, ValueError) as e: # p.ej. archivo truncado: se regenera desde el CSV
+            print(f"Aviso: no se pudo leer {parquet_path} ({e}), se regenera desde el CSV")
+
+    table = _read_csv_typed(csv_path)
+    try:
+        _write_parquet_atomic(table, parquet_path)
+    except OSError as e: # p.ej. directorio de solo lectura: se sigue con la tabla ya leída
+        print(f"Aviso: no se pudo guardar {parquet_path}: {e}")
+    if columns is not None:
+        table = table.select(columns)
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+def _load_data_polars(mkt_leads_path: str, closed_deals_path: str) -> pd.DataFrame:
+    """
+    Lee y combina ambos CSV con el planificador lazy de Polars (dependencia opcional).
+    El join se ejecuta en Polars y el resultado se devuelve como DataFrame de pandas.
+    """
+    import polars as pl # Importación diferida: solo se requiere con engine='polars'
+    df_mkt = pl.scan_csv(mkt_leads_path, try_parse_dates=True)
+    df_closed = pl.scan_csv(closed_deals_path, try_parse_dates=True)
+    try:
+        # maintain_order='left': mismo orden de filas que el merge de pandas
+        joined = df_mkt.join(df_closed, on='mql_id', how='left', maintain_order='left')
+    except TypeError: # Polars anterior a maintain_order: su left join ya conservaba el orden de la izquierda
+        joined = df_mkt.join(df_closed, on='mql_id', how='left')
+    return joined.collect().to_pandas()
+
+def load_data(data_path: str = '../data/raw', engine: str = 'pandas') -> pd.DataFrame:
     """
     Carga los datasets de leads y deals, los combina y devuelve un único DataFrame.
 
     Args:
         data_path (str): Ruta al directorio que contiene los archivos CSV.
                         Se espera encontrar 'olist_marketing_qualified_leads_dataset.csv' 
-                        y 'olist_closed_deals_dataset.csv' en este directorio.
+                        y 'olist_closed_deals_dataset.csv' en este directorio
+                        (se leen a través de su copia Parquet, ver load_dataset).
+        engine (str): 'pandas' (por defecto) o 'polars' para hacer la lectura y el join
+                      con Polars (requiere tener polars instalado; si no, se devuelve un
+                      DataFrame vacío como ante cualquier otro error de carga).
 
     Returns:
         pd.DataFrame: DataFrame combinado con la información de MQLs y Closed Deals.
@@ -23,9 +155,18 @@ def load_data(data_path: str = '../data/raw') -> pd.DataFrame:
         # raise FileNotFoundError(f"Archivos de datos no encontrados en {data_path}")
         return pd.DataFrame() # Devolver DataFrame vacío en caso de error
 
+    if engine not in ('pandas', 'polars'):
+        raise ValueError(f"engine debe ser 'pandas' o 'polars', no {engine!r}")
+
     try:
-        df_mkt = pd.read_csv(mkt_leads_path)
-        df_closed = pd.read_csv(closed_deals_path)
+        if engine == 'polars':
+            return _load_data_polars(mkt_leads_path, closed_deals_path)
+
+        # Los dos archivos son independientes: se leen en paralelo (pyarrow/read_csv liberan el GIL)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            f_mkt = executor.submit(load_dataset, mkt_leads_path)
+            f_closed = executor.submit(load_dataset, closed_deals_path)
+            df_mkt, df_closed = f_mkt.result(), f_closed.result()
         
         # Combinar los dataframes
         df_mkt_closed = df_mkt.merge(df_closed, on='mql_id', how='left')
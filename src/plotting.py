@@ -1,7 +1,11 @@
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 
+# Máximo de puntos por serie que se envían al navegador en los gráficos de líneas
+MAX_PLOT_POINTS = 5000
+
 def plot_days_to_convert_boxplot(df_processed: pd.DataFrame):
     """
     Genera un gráfico de cajas de los días para convertir por origen.
@@ -12,22 +16,45 @@ def plot_days_to_convert_boxplot(df_processed: pd.DataFrame):
     Returns:
         Objeto de figura Plotly.
     """
-    # Filtrar leads convertidos y con valor válido en 'days_to_convert'
-    df_plot = df_processed.query("target == 1 and days_to_convert.notna() and origin != 'unknown'").copy()
-    
-    # Asegurarse de que 'days_to_convert' sea numérico
-    df_plot['days_to_convert'] = pd.to_numeric(df_plot['days_to_convert'], errors='coerce')
-    df_plot.dropna(subset=['days_to_convert'], inplace=True)
-
-    fig = px.box(
-        df_plot, 
-        x='origin', 
-        y='days_to_convert', 
+    # Filtrar leads convertidos y con valor válido en 'days_to_convert' con una máscara NumPy
+    # (solo se extraen las dos columnas necesarias, sin copiar el DataFrame)
+    days_all = pd.to_numeric(df_processed['days_to_convert'], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    mask = (df_processed['target'] == 1).to_numpy() & ~np.isnan(days_all) & (df_processed['origin'] != 'unknown').to_numpy()
+    days_to_convert = days_all[mask]
+    # Códigos por origen en orden de aparición (los orígenes nulos quedan con -1 y se omiten)
+    codes, origins = pd.factorize(df_processed['origin'].to_numpy()[mask])
+
+    # Cuartiles y bigotes (Tukey, 1.5 * IQR) calculados en Python: Plotly recibe solo las
+    # estadísticas de cada caja y los outliers, no todos los puntos. method='hazen' reproduce
+    # los cuartiles de px.box (quartilemethod='linear'). La leyenda y el hover de los outliers
+    # llevan las mismas etiquetas que px.box; el hover de cada caja muestra sus estadísticas
+    fig = go.Figure()
+    colors = px.colors.qualitative.Plotly
+    for i, origin in enumerate(origins):
+        values = days_to_convert[codes == i]
+        q1, median, q3 = np.percentile(values, [25, 50, 75], method='hazen')
+        iqr = q3 - q1
+        in_fences = (values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)
+        color = colors[i % len(colors)]
+        fig.add_trace(go.Box(
+            x=[origin], q1=[q1], median=[median], q3=[q3],
+            lowerfence=[values[in_fences].min()], upperfence=[values[in_fences].max()],
+            name=origin, legendgroup=origin, marker_color=color
+        ))
+        outliers = values[~in_fences]
+        if outliers.size:
+            fig.add_trace(go.Scatter(
+                x=[origin] * outliers.size, y=outliers, mode='markers',
+                name=origin, legendgroup=origin, showlegend=False, marker_color=color,
+                hovertemplate='Origen del Lead=%{x}<br>Días para Convertir=%{y}<extra></extra>'
+            ))
+
+    fig.update_layout(
         title='Distribución de Días para Convertir por Origen',
-        labels={'origin': 'Origen del Lead', 'days_to_convert': 'Días para Convertir'},
-        color='origin' # Opcional: colorear por origen
+        xaxis_title="Origen del Lead",
+        yaxis_title="Días para Convertir",
+        legend_title="Origen del Lead"
     )
-    fig.update_layout(xaxis_title="Origen del Lead", yaxis_title="Días para Convertir")
     
     return fig
 
@@ -49,7 +76,8 @@ def plot_conversion_scatter(origin_conversion: pd.DataFrame):
         color='origin_score', 
         hover_name='origin',
         title='Comparación de Orígenes por Tasa de Conversión y Días para Convertir',
-        size_max=60 # Ajustar según sea necesario para una buena visualización
+        size_max=60, # Ajustar según sea necesario para una buena visualización
+        render_mode='webgl' # Scattergl: un solo canvas WebGL en lugar de un nodo SVG por burbuja
     )
     
     # Agregar línea horizontal punteada en y=0.5
@@ -60,70 +88,6 @@ def plot_conversion_scatter(origin_conversion: pd.DataFrame):
 
     return fig
 
-def plot_actual_vs_predicted_weekly(actuals_df: pd.DataFrame, forecast_df: pd.DataFrame, title='Actual vs. Predicted Weekly MQLs'):
-    """
-    Generates a Plotly figure comparing actual weekly MQLs with predictions.
-    Connects the last actual point to the first predicted point.
-
-    Args:
-        actuals_df (pd.DataFrame): DataFrame with actual data (needs DatetimeIndex and 'Actual MQLs' column).
-        forecast_df (pd.DataFrame): DataFrame with predicted data (needs DatetimeIndex and 'Predicted MQLs' column).
-                                      Should align chronologically after actuals_df.
-        title (str): Title for the plot.
-
-    Returns:
-        go.Figure: Plotly figure object.
-    """
-    fig = go.Figure()
-
-    actual_color = 'rgb(99, 110, 250)'
-    predicted_color = 'rgb(239, 85, 59)'
-    mql_col_actual = 'Actual MQLs'       # Assuming this is the column name
-    mql_col_pred = 'Predicted MQLs'    # Assuming this is the column name
-
-    # Ensure dataframes are not empty before plotting
-    if not actuals_df.empty:
-        fig.add_trace(go.Scatter(
-            x=actuals_df.index,
-            y=actuals_df[mql_col_actual],
-            mode='lines',
-            name='Actual',
-            line=dict(color=actual_color)
-        ))
-
-    if not forecast_df.empty:
-        fig.add_trace(go.Scatter(
-            x=forecast_df.index,
-            y=forecast_df[mql_col_pred],
-            mode='lines',
-            name='Predicted',
-            line=dict(color=predicted_color)
-        ))
-
-    # Add connecting line if both dataframes have data
-    if not actuals_df.empty and not forecast_df.empty:
-        last_actual_x = actuals_df.index[-1]
-        last_actual_y = actuals_df[mql_col_actual].iloc[-1]
-        first_predicted_x = forecast_df.index[0]
-        first_predicted_y = forecast_df[mql_col_pred].iloc[0]
-
-        fig.add_trace(go.Scatter(
-            x=[last_actual_x, first_predicted_x],
-            y=[last_actual_y, first_predicted_y],
-            mode='lines',
-            line=dict(color=predicted_color), # Match prediction line color
-            showlegend=False
-        ))
-
-    fig.update_layout(
-        title=title,
-        xaxis_title='Date',
-        yaxis_title='MQL Count',
-        legend_title='Data Type',
-        hovermode="x unified"
-    )
-    return fig
-
 def plot_aggregated_mqls_by_period(df_agg: pd.DataFrame, title='MQLs por contact_period'):
     """
     Generates a Plotly figure showing aggregated MQLs (Actual vs Predicted) by period.
@@ -144,6 +108,14 @@ def plot_aggregated_mqls_by_period(df_agg: pd.DataFrame, title='MQLs por contact
                                         'showarrow': False, 'font': {'size': 16}}])
         return fig
         
+    # Series muy largas se diezman antes de graficar: dentro de cada 'Data Type' se toma una de
+    # cada `step` filas, con step = ceil(tamaño / MAX_PLOT_POINTS), para no pasar del límite por serie
+    grouped = df_agg.groupby('Data Type', observed=True, sort=False)
+    series_sizes = grouped['mql_count'].transform('size').to_numpy()
+    if (series_sizes > MAX_PLOT_POINTS).any():
+        steps = -(-series_sizes // MAX_PLOT_POINTS)
+        df_agg = df_agg[grouped.cumcount().to_numpy() % steps == 0]
+
     fig = px.line(df_agg, x='contact_period', y='mql_count', color='Data Type', title=title,
                   labels={'mql_count': 'MQL Count', 'contact_period': 'Contact Period'})
     
@@ -154,28 +126,28 @@ def plot_aggregated_mqls_by_period(df_agg: pd.DataFrame, title='MQLs por contact
 def plot_actual_vs_predicted_weekly(actuals_df: pd.DataFrame, forecast_df: pd.DataFrame):
     """
     Generates a Plotly figure comparing actual weekly MQLs with predictions.
-    Connects the last actual point to the first predicted point.
 
     Args:
-        actuals_df (pd.DataFrame): DataFrame with actual data (needs DatetimeIndex and 'Actual MQLs' column).
-        forecast_df (pd.DataFrame): DataFrame with predicted data (needs DatetimeIndex and 'Predicted MQLs' column).
+        actuals_df (pd.DataFrame): DataFrame with actual data ('first_contact_date' and 'mql_count' columns).
+        forecast_df (pd.DataFrame): DataFrame with predicted data (same columns).
                                       Should align chronologically after actuals_df.
-        title (str): Title for the plot.
 
     Returns:
         go.Figure: Plotly figure object.
     """
     fig = go.Figure()
 
-    # Añadir la traza de datos históricos reales
-    fig.add_trace(go.Scatter(x=actuals_df['first_contact_date'], y=actuals_df['mql_count'],
+    # Añadir la traza de datos históricos reales (Scattergl: se dibuja con WebGL, no con un nodo SVG por punto)
+    # Se pasan arrays NumPy (no Series). Los conteos reales van como int64: Plotly los empaqueta
+    # con el tipo entero más estrecho que los contiene (p.ej. int16), que ocupa menos que float32
+    fig.add_trace(go.Scattergl(x=actuals_df['first_contact_date'].to_numpy(), y=actuals_df['mql_count'].to_numpy(dtype=np.int64),
                     mode='lines',
                     name='Actual MQLs'))
 
-    # Añadir la traza de la predicción
+    # Añadir la traza de la predicción (float64 de SARIMAX -> float32: la mitad de bytes hacia el navegador)
     # Asegúrate de que forecast_df no esté vacío después del procesamiento
     if not forecast_df.empty:
-        fig.add_trace(go.Scatter(x=forecast_df['first_contact_date'], y=forecast_df['mql_count'],
+        fig.add_trace(go.Scattergl(x=forecast_df['first_contact_date'].to_numpy(), y=forecast_df['mql_count'].to_numpy(dtype=np.float32),
                         mode='lines',
                         name='Predicted MQLs (SARIMA)',
                         line=dict(dash='dash'))) # Estilo de línea diferente
@@ -1,7 +1,12 @@
 import pandas as pd
 import numpy as np
 
-def get_low_completion_columns(df: pd.DataFrame, seller_id_col: str = 'seller_id', threshold: int = 80) -> list:
+# Columnas que preprocess_data elimina siempre / que nunca elimina (se usan en el análisis y el funnel)
+ALWAYS_DROPPED_COLUMNS = frozenset({'landing_page_id', 'seller_id', 'sdr_id'})
+ESSENTIAL_COLUMNS = frozenset({'mql_id', 'sr_id', 'won_date', 'origin', 'first_contact_date'})
+
+def get_low_completion_columns(df: pd.DataFrame, seller_id_col: str = 'seller_id', threshold: int = 80,
+                               columns: list = None) -> pd.Index:
     """
     Retorna las columnas que tienen un porcentaje de completitud menor al threshold especificado,
     calculado en relación a la cantidad de seller_id únicos.
@@ -14,27 +19,73 @@ def get_low_completion_columns(df: pd.DataFrame, seller_id_col: str = 'seller_id
         Nombre de la columna que contiene el seller_id
     threshold : int
         Porcentaje mínimo de completitud requerido (0-100)
+    columns : list, opcional
+        Columnas a evaluar. Si es None se evalúan todas las del DataFrame
     
     Returns:
     --------
-    list
-        Lista de columnas que no cumplen con el porcentaje mínimo de completitud
+    pandas.Index
+        Columnas que no cumplen con el porcentaje mínimo de completitud
     """
     
     # Cantidad de sellers únicos
     total_sellers = df[seller_id_col].nunique()
     
-    # Calcular porcentaje de completitud para cada columna
-    completion_rates = (df.count() / total_sellers * 100).round(2)
+    # Valores no nulos por columna: una sola máscara isna sumada por columnas en NumPy
+    # (solo sobre las columnas candidatas, si se indicaron)
+    candidates = df if columns is None else df[columns]
+    # Columnas int/uint/bool de NumPy no pueden tener nulos: su conteo es len(df) sin escanearlas
+    may_have_na = np.array([not (dtype.kind in 'iub' and not pd.api.types.is_extension_array_dtype(dtype))
+                            for dtype in candidates.dtypes], dtype=bool)
+    non_null_counts = np.full(len(candidates.columns), len(candidates), dtype=np.int64)
+    if may_have_na.any():
+        nullable = candidates.iloc[:, may_have_na]
+        non_null_counts[may_have_na] -= nullable.isna().to_numpy().sum(axis=0)
+
+    # Calcular porcentaje de completitud para cada columna (sin sellers: inf/NaN, como antes)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        completion_rates = np.round(non_null_counts / total_sellers * 100, 2)
     
     # Filtrar columnas por debajo del threshold
-    low_completion_cols = completion_rates[completion_rates < threshold].index.tolist()
+    low_completion_cols = candidates.columns[completion_rates < threshold]
     
     return low_completion_cols
 
+def _parse_dates(values: pd.Series, exact: bool = True) -> pd.Series:
+    """
+    Convierte a datetime con formato fijo '%Y-%m-%d' (strptime estricto, sin fallback a dateutil).
+    cache=True parsea una sola vez cada string repetido. Si la columna ya es datetime64
+    (p.ej. viene de la copia Parquet) se devuelve sin volver a parsear.
+    Con exact=False se toma solo la fecha inicial de strings tipo '%Y-%m-%d %H:%M:%S'.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    return pd.to_datetime(values, format='%Y-%m-%d', errors='coerce', cache=True, exact=exact)
+
+def _conversion_columns(won_date: pd.Series, first_contact_date: pd.Series) -> tuple:
+    """
+    Calcula 'target' (1 si hay won_date) y 'days_to_convert' en una sola pasada sobre los int64
+    de las fechas: la máscara de NaT de won_date se reutiliza para ambas columnas.
+
+    Returns:
+        tuple: (target como int8, days_to_convert como float64 con NaN si falta alguna fecha).
+    """
+    won = won_date.to_numpy(dtype='datetime64[s]')
+    first_contact = first_contact_date.to_numpy(dtype='datetime64[s]')
+    won_na = np.isnat(won)
+    target = (~won_na).astype(np.int8)
+    # División entera: igual que Timedelta.days (redondea hacia abajo). Las operaciones se hacen
+    # in place sobre un único buffer de diferencias, sin temporales de np.where
+    days = won.view('i8') - first_contact.view('i8')
+    days //= 86_400
+    days_to_convert = days.astype(np.float64)
+    days_to_convert[won_na | np.isnat(first_contact)] = np.nan
+    return target, days_to_convert
+
 def preprocess_data(df_mkt_closed: pd.DataFrame) -> pd.DataFrame:
     """
     Aplica los pasos de preprocesamiento al DataFrame combinado.
+    No modifica el DataFrame de entrada: las columnas se escriben sobre la copia que devuelve drop.
     
     Args:
         df_mkt_closed: DataFrame combinado de marketing leads y closed deals.
@@ -42,31 +93,29 @@ def preprocess_data(df_mkt_closed: pd.DataFrame) -> pd.DataFrame:
     Returns:
         DataFrame preprocesado.
     """
-    # Usar el análisis de completitud
-    low_quality_columns = get_low_completion_columns(df_mkt_closed, threshold=60)
-    
+    # Nota: 'sr_id' y 'won_date' están en ESSENTIAL_COLUMNS porque se usan en calculate_funnel_metrics
+    # Usar el análisis de completitud, solo sobre las columnas que realmente se podrían eliminar
+    candidate_cols = df_mkt_closed.columns.difference(ESSENTIAL_COLUMNS | ALWAYS_DROPPED_COLUMNS, sort=False)
+    low_quality_columns = get_low_completion_columns(df_mkt_closed, threshold=60, columns=candidate_cols)
+
     # Definir columnas a eliminar (incluyendo las identificadas por baja completitud)
-    # Nota: Asegúrate de que 'sr_id' y 'won_date' no se eliminen si se usan en calculate_funnel_metrics
-    columns_to_drop = ['landing_page_id', 'seller_id', 'sdr_id'] + low_quality_columns
-    # Asegurarse de no eliminar columnas esenciales si están en la lista
-    essential_cols = ['mql_id', 'sr_id', 'won_date', 'origin', 'first_contact_date'] 
-    columns_to_drop = [col for col in columns_to_drop if col not in essential_cols and col in df_mkt_closed.columns]
+    # Operaciones de conjuntos sobre Index (sin comprensiones de listas)
+    columns_to_drop = df_mkt_closed.columns.intersection(ALWAYS_DROPPED_COLUMNS).union(low_quality_columns)
 
     df_processed = df_mkt_closed.drop(columns=columns_to_drop)
     
-    # Convertir fechas y crear nuevas columnas
-    df_processed = df_processed.assign(
-        first_contact_date=lambda df: pd.to_datetime(df['first_contact_date'], format='%Y-%m-%d', errors='coerce'),
-        # Extraer solo la fecha de 'won_date' antes de convertir
-        won_date_cleaned=lambda df: df['won_date'].astype(str).str[:10],
-        won_date=lambda df: pd.to_datetime(df['won_date_cleaned'], format='%Y-%m-%d', errors='coerce'),
-        target=lambda df: np.where(df['won_date'].isnull(), 0, 1),
-        origin=lambda df: np.where(df['origin'].isnull(), 'unknown', df['origin'])
-    ).drop(columns=['won_date_cleaned']) # Eliminar la columna auxiliar
-
-    # Calcular days_to_convert solo si ambas fechas están presentes
-    mask = df_processed['won_date'].notna() & df_processed['first_contact_date'].notna()
-    df_processed.loc[mask, 'days_to_convert'] = (df_processed.loc[mask, 'won_date'] - df_processed.loc[mask, 'first_contact_date']).dt.days
-    df_processed['days_to_convert'].fillna(np.nan, inplace=True) # Asegurar que los no calculados sean NaN
+    # Convertir fechas y crear nuevas columnas: escrituras columna a columna sobre el resultado
+    # del drop (cada una reemplaza solo su columna, sin copiar el resto del DataFrame)
+    df_processed['first_contact_date'] = _parse_dates(df_processed['first_contact_date'])
+    # Quedarse solo con la fecha de 'won_date' (un único parseo, sin columna auxiliar de strings)
+    df_processed['won_date'] = _parse_dates(df_processed['won_date'], exact=False).dt.normalize()
+    # Categórica: los groupby por origen trabajan sobre códigos enteros. fillna solo escribe
+    # los códigos nulos (sin reconstruir un array de strings con np.where)
+    origin = df_processed['origin'].astype('category')
+    if 'unknown' not in origin.cat.categories:
+        origin = origin.cat.add_categories('unknown')
+    df_processed['origin'] = origin.fillna('unknown')
+    df_processed['target'], df_processed['days_to_convert'] = _conversion_columns(df_processed['won_date'],
+                                                                                  df_processed['first_contact_date'])
 
-    return df_processed 
\ No newline at end of file
+    return df_processed
\ No newline at end of file